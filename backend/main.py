@@ -1,21 +1,57 @@
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
-from routes import auth, users, maps, files
+import os
 
-app = FastAPI(title="Admin Dashboard API", version="1.0.0")
+from fastapi import FastAPI, Request
+from fastapi.responses import HTMLResponse, ORJSONResponse
+from middleware import PUBLIC_PATHS, FastCORS, JWTAuthMiddleware
+from routes import auth, users, maps, files
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+app = FastAPI(
+    title="Admin Dashboard API",
+    version="1.0.0",
+    default_response_class=ORJSONResponse,
 )
 
-app.include_router(auth.router,  prefix="/auth",  tags=["auth"])
-app.include_router(users.router, prefix="/users", tags=["users"])
-app.include_router(maps.router,  prefix="/maps",  tags=["maps"])
-app.include_router(files.router, prefix="/files", tags=["files"])
+# Dev-only profiler: start with PROFILE=1 (needs `pip install pyinstrument`),
+# then append ?profile=1 to any URL to get a pyinstrument HTML report back.
+if os.getenv("PROFILE"):
+    from pyinstrument import Profiler
+
+    @app.middleware("http")
+    async def profile_request(request: Request, call_next):
+        if not request.query_params.get("profile"):
+            return await call_next(request)
+        profiler = Profiler(async_mode="enabled")
+        profiler.start()
+        await call_next(request)
+        profiler.stop()
+        return HTMLResponse(profiler.output_html())
+
+# The last middleware added is outermost: CORS wraps auth, so 401s carry CORS headers
+app.add_middleware(JWTAuthMiddleware, public_paths=PUBLIC_PATHS)
+app.add_middleware(FastCORS, origin="http://localhost:5173")
+
+app.include_router(auth.router,  tags=["auth"])
+app.include_router(users.router, tags=["users"])
+app.include_router(maps.router,  tags=["maps"])
+app.include_router(files.router, tags=["files"])
+
+
+# Auth lives in JWTAuthMiddleware, not in FastAPI dependencies, so the Bearer
+# scheme (and the Authorize button in /docs) is added to the schema by hand
+def openapi_with_bearer() -> dict:
+    if app.openapi_schema is None:
+        schema = FastAPI.openapi(app)
+        schema.setdefault("components", {})["securitySchemes"] = {
+            "HTTPBearer": {"type": "http", "scheme": "bearer", "bearerFormat": "JWT"},
+        }
+        for path, operations in schema["paths"].items():
+            if path not in PUBLIC_PATHS:
+                for operation in operations.values():
+                    operation["security"] = [{"HTTPBearer": []}]
+    return app.openapi_schema
+
+
+app.openapi = openapi_with_bearer
 
 
 @app.get("/")
@@ -0,0 +1,127 @@
+"""
+middleware.py
+─────────────────────────────────────────────────────────────────────────────
+Purpose : Pure-ASGI middleware used by main.py. These work directly on the
+          raw ASGI scope / messages instead of building Request / Response
+          objects, so they add almost nothing to the per-request cost.
+
+Used by : main.py (registered with app.add_middleware)
+
+Key classes
+  FastCORS           – fixed-origin CORS layer: answers preflights with 204 and
+                       appends the allow-origin / allow-credentials headers to
+                       every HTTP response
+  JWTAuthMiddleware  – fail-closed: verifies the Bearer JWT for every HTTP path
+                       except PUBLIC_PATHS, once per request
+                       (auth.verify_token), stores the user in
+                       scope["user"] and deps.CURRENT_USER, and answers 401
+                       itself on failure
+"""
+from __future__ import annotations
+
+from starlette.routing import get_route_path
+
+from routes.auth import verify_token
+from routes.deps import CURRENT_USER
+
+_PREFLIGHT_METHODS = b"GET, POST, PUT, DELETE, OPTIONS"
+_PREFLIGHT_MAX_AGE = b"600"
+
+# Paths served without a token (matched after root_path is stripped, like routing)
+PUBLIC_PATHS = frozenset({
+    "/", "/auth/login", "/openapi.json", "/docs", "/docs/oauth2-redirect", "/redoc",
+})
+
+
+class FastCORS:
+    def __init__(self, app, origin: str) -> None:
+        self.app = app
+        self.cors_headers = [
+            (b"access-control-allow-origin", origin.encode("latin-1")),
+            (b"access-control-allow-credentials", b"true"),
+        ]
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        if scope["method"] == "OPTIONS":
+            request_headers = None
+            is_preflight = False
+            for name, value in scope["headers"]:
+                if name == b"access-control-request-method":
+                    is_preflight = True
+                elif name == b"access-control-request-headers":
+                    request_headers = value
+            if is_preflight:
+                await self._preflight(send, request_headers)
+                return
+
+        cors_headers = self.cors_headers
+
+        async def send_with_cors(message) -> None:
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", ()), *cors_headers]
+            await send(message)
+
+        await self.app(scope, receive, send_with_cors)
+
+    async def _preflight(self, send, request_headers: bytes | None) -> None:
+        headers = [
+            *self.cors_headers,
+            (b"access-control-allow-methods", _PREFLIGHT_METHODS),
+            (b"access-control-max-age", _PREFLIGHT_MAX_AGE),
+            (b"content-length", b"0"),
+        ]
+        if request_headers:
+            headers.append((b"access-control-allow-headers", request_headers))
+        await send({"type": "http.response.start", "status": 204, "headers": headers})
+        await send({"type": "http.response.body", "body": b""})
+
+
+class JWTAuthMiddleware:
+    def __init__(self, app, public_paths: frozenset[str] = PUBLIC_PATHS) -> None:
+        self.app = app
+        self.public_paths = public_paths
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http" or get_route_path(scope) in self.public_paths:
+            await self.app(scope, receive, send)
+            return
+
+        token = None
+        for name, value in scope["headers"]:
+            if name == b"authorization":
+                scheme, _, credentials = value.partition(b" ")
+                if scheme.lower() == b"bearer" and credentials:
+                    token = credentials.decode("latin-1")
+                break
+        if token is None:
+            await _unauthorized(send, b'{"detail":"Not authenticated"}')
+            return
+
+        user = verify_token(token)
+        if user is None:
+            await _unauthorized(send, b'{"detail":"Invalid token"}')
+            return
+
+        scope["user"] = user
+        reset = CURRENT_USER.set(user)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            CURRENT_USER.reset(reset)
+
+
+async def _unauthorized(send, body: bytes) -> None:
+    await send({
+        "type": "http.response.start",
+        "status": 401,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode("latin-1")),
+            (b"www-authenticate", b"Bearer"),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
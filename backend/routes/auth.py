@@ -5,27 +5,34 @@ Purpose : FastAPI router for authentication. Provides the POST /auth/login
           endpoint that validates credentials against a mock user store and
           returns a signed JWT access token.
 
-Used by : main.py (mounted under /auth prefix),
-          users.py (imports SECRET_KEY, ALGORITHM, MOCK_USERS)
+Used by : main.py (app.include_router; the /auth prefix is set on its PrefixRouter),
+          middleware.py (import verify_token)
 
 Key variables
   SECRET_KEY                 – HS256 signing secret (change in production)
   ALGORITHM                  – 'HS256'
   ACCESS_TOKEN_EXPIRE_MINUTES – 24 hours
   MOCK_USERS                 – dict[email → user dict] in-memory credential store;
-                               exported to users.py for token verification
+                               verify_token() resolves a token's sub against it
+  TOKEN_CACHE                – raw token → (exp, user) for already-verified JWTs;
+                               each entry lives until its token's exp, capped at
+                               TOKEN_CACHE_MAX_AGE seconds
   LoginRequest               – Pydantic model: { email, password }
   create_access_token()      – encodes { sub: email, id, exp } into a JWT
+  verify_token()             – raw token → user dict (None if invalid), via TOKEN_CACHE
 """
 from __future__ import annotations
 
+import time
 from datetime import datetime, timedelta
 from typing import Optional
-from fastapi import APIRouter, HTTPException, status
+from cachetools import TLRUCache
+from fastapi import HTTPException, status
 from pydantic import BaseModel
-from jose import jwt
+import jwt
+from .routing import PrefixRouter
 
-router = APIRouter()
+router = PrefixRouter(prefix="/auth")
 
 SECRET_KEY = "change-this-in-production-please"
 ALGORITHM = "HS256"
@@ -50,6 +57,27 @@ MOCK_USERS: dict[str, dict] = {
 }
 
 
+# Decoder state built once instead of per call: require-claims options are
+# merged into the PyJWT instance, the secret is pre-encoded to bytes.
+_JWT = jwt.PyJWT(options={"require": ["exp", "sub"]})
+_SECRET_BYTES = SECRET_KEY.encode()
+_ALGORITHMS = [ALGORITHM]
+
+TOKEN_CACHE_MAX_AGE = 60  # seconds; bounds how stale a cached user dict can get
+
+
+def _token_expiry(_token: str, entry: tuple[int, dict], now: float) -> float:
+    return min(entry[0], now + TOKEN_CACHE_MAX_AGE)
+
+
+# Verified tokens → (exp, user). Keyed on the raw token string so a replayed
+# bearer token skips the HMAC check; entries drop out when `exp` passes or
+# after TOKEN_CACHE_MAX_AGE, whichever comes first.
+TOKEN_CACHE: TLRUCache[str, tuple[int, dict]] = TLRUCache(
+    maxsize=4096, ttu=_token_expiry, timer=time.time
+)
+
+
 class LoginRequest(BaseModel):
     email: str
     password: str
@@ -62,8 +90,23 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
+def verify_token(token: str) -> Optional[dict]:
+    """Return the user for a valid access token, or None. Checks TOKEN_CACHE first."""
+    cached = TOKEN_CACHE.get(token)
+    if cached is not None:
+        return cached[1]
+    try:
+        payload = _JWT.decode(token, _SECRET_BYTES, algorithms=_ALGORITHMS)
+    except jwt.InvalidTokenError:
+        return None
+    user = MOCK_USERS.get(payload["sub"])
+    if user is not None:
+        TOKEN_CACHE[token] = (payload["exp"], user)
+    return user
+
+
 @router.post("/login")
-def login(request: LoginRequest):
+async def login(request: LoginRequest):
     user = MOCK_USERS.get(request.email)
     if not user or user["password"] != request.password:
         raise HTTPException(
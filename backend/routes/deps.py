@@ -0,0 +1,41 @@
+"""
+routes/deps.py
+─────────────────────────────────────────────────────────────────────────────
+Purpose : Pieces shared by middleware and several routers. The
+          authenticated user is verified once by JWTAuthMiddleware and handed
+          to endpoints through a ContextVar, so protected endpoints need no
+          FastAPI dependency to get it.
+
+Used by : middleware.py (sets CURRENT_USER), users.py (get_current_user()),
+          maps.py / users.py (reject_null on the partial-update models)
+
+Key variables
+  CURRENT_USER      – ContextVar holding the verified user dict for the running request
+  get_current_user  – returns CURRENT_USER's value (401 if the middleware set
+                      no user for this request)
+  reject_null       – pydantic "before" validator for PUT-model fields that may
+                      be omitted but not set to null
+"""
+from __future__ import annotations
+
+from contextvars import ContextVar
+from fastapi import HTTPException, status
+
+CURRENT_USER: ContextVar[dict] = ContextVar("current_user")
+
+
+def get_current_user() -> dict:
+    user = CURRENT_USER.get(None)
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return user
+
+
+def reject_null(value):
+    if value is None:
+        raise ValueError("may not be null")
+    return value
@@ -5,54 +5,55 @@ Purpose : FastAPI router for file management. Supports upload (as base64),
           listing, metadata update (description / tags), and deletion.
           Files are stored entirely in-memory as base64 strings (mock only).
 
-Used by : main.py (mounted under /files prefix)
-Imports : SECRET_KEY, ALGORITHM from routes/auth.py
-          get_current_user dependency re-implemented locally (same pattern)
+Used by : main.py (app.include_router; the /files prefix is set on its PrefixRouter)
+Auth    : every /files/* request is verified by JWTAuthMiddleware (middleware.py)
+          before it reaches this router; the user dict is in scope["user"]
 
 Key variables
-  _FILE_LIST    – mutable in-memory list of file dicts (3 seed files)
+  _FILES        – mutable in-memory store, id → file dict (3 seed files);
+                  insertion-ordered, so listing keeps upload order
+  _FILE_META    – parallel id → dict of the same files minus content_base64;
+                  kept in step with _FILES by the write endpoints and served
+                  by GET /files/
   _next_id      – auto-increment counter for new files (starts at 4)
+  MAX_UPLOAD_BYTES – largest decoded upload accepted by POST /files/ (10 MiB)
+  _RAW_CHUNK_CHARS – base64 characters decoded per chunk by GET /files/{id}/raw
+  _INLINE_TYPES – mime types GET /files/{id}/raw lets the browser render;
+                  anything else (HTML, SVG, …) is served as an attachment
 
 Endpoints
   GET    /files/       – list all files (content_base64 excluded for performance)
   GET    /files/{id}   – get single file including content_base64 (for viewers)
-  POST   /files/       – upload a new file (full payload inc. content_base64)
+  GET    /files/{id}/raw – stream the decoded file bytes with its mime_type
+                         (nosniff, Content-Disposition from _INLINE_TYPES)
+  POST   /files/       – upload a new file (full payload inc. content_base64);
+                         content is base64-validated and `size` is set from the
+                         decoded length (413 if over MAX_UPLOAD_BYTES)
   PUT    /files/{id}   – update description and tags only
   DELETE /files/{id}   – delete a file by id
 """
 from __future__ import annotations
 
-import base64
-from typing import Any, List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from jose import jwt, JWTError
+import binascii
+import pybase64
+from typing import Any, AsyncIterator, List, Optional
+from urllib.parse import quote
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from .auth import SECRET_KEY, ALGORITHM, MOCK_USERS
+from .routing import PrefixRouter
 
-router   = APIRouter()
-security = HTTPBearer()
-
-# ── Auth dependency (same pattern as users.py) ────────────────────────────────
-def get_current_user(creds: HTTPAuthorizationCredentials = Depends(security)) -> dict:
-    try:
-        payload = jwt.decode(creds.credentials, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub", "")
-        if email not in MOCK_USERS:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-        return MOCK_USERS[email]
-    except JWTError:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+router = PrefixRouter(prefix="/files")
 
 # ── Seed data ─────────────────────────────────────────────────────────────────
-_txt_b64 = base64.b64encode(
+_txt_b64 = pybase64.b64encode(
     b"Hello, this is a sample text file.\n\n"
     b"It contains multiple lines of plain text.\n"
     b"Use the File Manager viewer to read the full content.\n\n"
     b"- Line four\n- Line five\n- Line six\n"
 ).decode()
 
-_csv_b64 = base64.b64encode(
+_csv_b64 = pybase64.b64encode(
     b"Name,Email,Department,Salary\n"
     b"Alice,alice@example.com,Engineering,95000\n"
     b"Bob,bob@example.com,Marketing,75000\n"
@@ -68,7 +69,17 @@ _png_b64 = (
     "BhYWFhYWFhawABUmVgUjAgAYLBEJ0QIKRAAAAABJRU5ErkJggg=="
 )
 
-_FILE_LIST: list[dict] = [
+_FILES: dict[int, dict] = {}
+_FILE_META: dict[int, dict] = {}
+
+
+def _add_file(full: dict) -> None:
+    """Store a file in _FILES and its light-weight projection in _FILE_META."""
+    _FILES[full["id"]] = full
+    _FILE_META[full["id"]] = {k: v for k, v in full.items() if k != "content_base64"}
+
+
+for _seed in (
     {
         "id": 1,
         "name": "readme.txt",
@@ -105,10 +116,50 @@ _FILE_LIST: list[dict] = [
         "folder":  "assets",
         "content_base64": _png_b64,
     },
-]
+):
+    _add_file(_seed)
 
 _next_id = 4
 
+MAX_UPLOAD_BYTES = 10 * 1024 * 1024
+_RAW_CHUNK_CHARS = 64 * 1024    # multiple of 4 → every slice decodes on its own
+# mime_type comes from the uploader, so only types that cannot run script are shown inline
+_INLINE_TYPES = frozenset({
+    "image/png", "image/jpeg", "image/gif", "image/webp",
+    "application/pdf", "text/plain", "text/csv",
+})
+
+
+def _strip_data_url(content_base64: str) -> str:
+    """Drop the `data:<mime>;base64,` prefix the UI's FileReader adds, if present."""
+    if content_base64.startswith("data:"):
+        return content_base64.partition(",")[2]
+    return content_base64
+
+
+def _decode_content(content_base64: str) -> bytes:
+    """Decode raw base64 or a data URL, rejecting anything that is not valid base64."""
+    return pybase64.b64decode(_strip_data_url(content_base64), validate=True)
+
+
+async def _iter_decoded(content_base64: str) -> AsyncIterator[bytes]:
+    """Decode stored base64 in 4-char-aligned slices so only one chunk is in memory."""
+    payload = _strip_data_url(content_base64)
+    for start in range(0, len(payload), _RAW_CHUNK_CHARS):
+        yield pybase64.b64decode(payload[start:start + _RAW_CHUNK_CHARS])
+
+
+def _raw_headers(name: str, mime_type: str) -> dict[str, str]:
+    """nosniff plus a Content-Disposition quoted the way Starlette's FileResponse does."""
+    base_type = mime_type.partition(";")[0].strip().lower()
+    disposition = "inline" if base_type in _INLINE_TYPES else "attachment"
+    quoted = quote(name)
+    if quoted != name:
+        disposition += f"; filename*=utf-8''{quoted}"
+    else:
+        disposition += f'; filename="{name}"'
+    return {"X-Content-Type-Options": "nosniff", "Content-Disposition": disposition}
+
 # ── Pydantic models ───────────────────────────────────────────────────────────
 class FileUpload(BaseModel):
     name:           str
@@ -129,28 +180,50 @@ class FileUpdate(BaseModel):
 
 # ── Endpoints ─────────────────────────────────────────────────────────────────
 @router.get("/")
-def list_files(_user: dict = Depends(get_current_user)) -> list[dict]:
+async def list_files() -> list[dict]:
     """Return all files without the content_base64 field (keep responses light)."""
-    return [{k: v for k, v in f.items() if k != "content_base64"} for f in _FILE_LIST]
+    return list(_FILE_META.values())
 
 
 @router.get("/{file_id}")
-def get_file(file_id: int, _user: dict = Depends(get_current_user)) -> dict:
+async def get_file(file_id: int) -> dict:
     """Return a single file including content_base64 for the viewer."""
-    for f in _FILE_LIST:
-        if f["id"] == file_id:
-            return f
-    raise HTTPException(status_code=404, detail="File not found")
+    f = _FILES.get(file_id)
+    if f is None:
+        raise HTTPException(status_code=404, detail="File not found")
+    return f
+
+
+@router.get("/{file_id}/raw")
+async def get_file_raw(file_id: int) -> StreamingResponse:
+    """Stream the decoded file content instead of embedding it in JSON."""
+    f = _FILES.get(file_id)
+    if f is None:
+        raise HTTPException(status_code=404, detail="File not found")
+    return StreamingResponse(
+        _iter_decoded(f["content_base64"]),
+        media_type=f["mime_type"],
+        headers=_raw_headers(f["name"], f["mime_type"]),
+    )
 
 
 @router.post("/", status_code=201)
-def upload_file(body: FileUpload, _user: dict = Depends(get_current_user)) -> dict:
+async def upload_file(body: FileUpload) -> dict:
     global _next_id
+    # Cheap upper bound first, so oversize bodies are rejected before decoding
+    if len(body.content_base64) * 3 // 4 > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail="File too large")
+    try:
+        raw = _decode_content(body.content_base64)
+    except binascii.Error:
+        raise HTTPException(status_code=422, detail="content_base64 is not valid base64")
+    if len(raw) > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail="File too large")
     new_file = {
         "id":             _next_id,
         "name":           body.name,
         "mime_type":      body.mime_type,
-        "size":           body.size,
+        "size":           len(raw),
         "description":    body.description,
         "tags":           body.tags,
         "uploaded":       body.uploaded,
@@ -158,27 +231,27 @@ def upload_file(body: FileUpload, _user: dict = Depends(get_current_user)) -> di
         "folder":         body.folder,
         "content_base64": body.content_base64,
     }
-    _FILE_LIST.append(new_file)
+    _add_file(new_file)
     _next_id += 1
     return new_file
 
 
 @router.put("/{file_id}")
-def update_file(file_id: int, body: FileUpdate, _user: dict = Depends(get_current_user)) -> dict:
-    for f in _FILE_LIST:
-        if f["id"] == file_id:
-            f["description"] = body.description
-            f["tags"]        = body.tags
-            f["project"]     = body.project
-            f["folder"]      = body.folder
-            return {k: v for k, v in f.items() if k != "content_base64"}
-    raise HTTPException(status_code=404, detail="File not found")
+async def update_file(file_id: int, body: FileUpdate) -> dict:
+    f = _FILES.get(file_id)
+    if f is None:
+        raise HTTPException(status_code=404, detail="File not found")
+    meta = _FILE_META[file_id]
+    for target in (f, meta):
+        target["description"] = body.description
+        target["tags"]        = body.tags
+        target["project"]     = body.project
+        target["folder"]      = body.folder
+    return meta
 
 
 @router.delete("/{file_id}", status_code=204)
-def delete_file(file_id: int, _user: dict = Depends(get_current_user)) -> None:
-    global _FILE_LIST
-    original_len = len(_FILE_LIST)
-    _FILE_LIST = [f for f in _FILE_LIST if f["id"] != file_id]
-    if len(_FILE_LIST) == original_len:
+async def delete_file(file_id: int) -> None:
+    if _FILES.pop(file_id, None) is None:
         raise HTTPException(status_code=404, detail="File not found")
+    del _FILE_META[file_id]
@@ -0,0 +1,173 @@
+"""
+routes/geoindex.py
+─────────────────────────────────────────────────────────────────────────────
+Purpose : Bounding-box index for point items (map markers / presets). Each
+          point's lat/lng is quantized and bit-interleaved into a Z-order
+          (Morton) key; the (key, id) pairs are kept in one sorted list, so a
+          bbox query is a handful of bisect range scans plus an exact check
+          on the few candidates, instead of a pass over every item.
+
+          points_in_polygon() is the vectorized (numpy) counterpart for
+          polygon regions: one boolean mask over a whole coordinate array.
+
+Used by : maps.py (GET /maps/custom and /maps/history ?bbox=…, /maps/history ?region=…)
+
+Key variables
+  MortonIndex         – sorted (key, id) array with add / discard / query
+  parse_bbox()        – "minlng,minlat,maxlng,maxlat" → float tuple (ValueError if bad)
+  points_in_polygon() – lng/lat arrays + GeoJSON polygon rings → inside mask
+"""
+from __future__ import annotations
+
+import math
+from bisect import bisect_left, bisect_right, insort
+from operator import itemgetter
+from typing import Sequence
+
+import numpy as np
+
+_SCALE = 100_000                    # 1e-5° ≈ 1 m quantization
+_AXIS_BITS = 26                     # 360 * 1e5 < 2**26
+_AXIS_MAX = (1 << _AXIS_BITS) - 1
+_REFINE_LEVELS = 6                  # quadtree levels used to split a bbox into key ranges
+
+_key_of = itemgetter(0)
+
+
+def _spread(n: int) -> int:
+    """Insert a zero bit between each of the low 32 bits of n."""
+    n &= 0xFFFFFFFF
+    n = (n | (n << 16)) & 0x0000FFFF0000FFFF
+    n = (n | (n << 8)) & 0x00FF00FF00FF00FF
+    n = (n | (n << 4)) & 0x0F0F0F0F0F0F0F0F
+    n = (n | (n << 2)) & 0x3333333333333333
+    n = (n | (n << 1)) & 0x5555555555555555
+    return n
+
+
+def _quantize(lat: float, lng: float) -> tuple[int, int]:
+    qx = min(max(int((lng + 180.0) * _SCALE), 0), _AXIS_MAX)
+    qy = min(max(int((lat + 90.0) * _SCALE), 0), _AXIS_MAX)
+    return qx, qy
+
+
+def _morton(qx: int, qy: int) -> int:
+    return _spread(qx) | (_spread(qy) << 1)
+
+
+def _key_ranges(qx0: int, qy0: int, qx1: int, qy1: int) -> list[tuple[int, int]]:
+    """Cover the quantized box with Morton key ranges (a superset of the box).
+
+    Starts from the smallest aligned quadtree cell holding both corners (the
+    keys' common prefix) and splits cells that straddle the box edge for up to
+    _REFINE_LEVELS levels; cells fully inside, or at the depth limit, become
+    one contiguous [lo, hi] key range each.
+    """
+    level = max((qx0 ^ qx1).bit_length(), (qy0 ^ qy1).bit_length())
+    stop = max(level - _REFINE_LEVELS, 0)
+    ranges: list[tuple[int, int]] = []
+    stack = [(qx0 >> level << level, qy0 >> level << level, level)]
+    while stack:
+        cx, cy, lvl = stack.pop()
+        size = 1 << lvl
+        if cx > qx1 or cy > qy1 or cx + size - 1 < qx0 or cy + size - 1 < qy0:
+            continue
+        inside = qx0 <= cx and cx + size - 1 <= qx1 and qy0 <= cy and cy + size - 1 <= qy1
+        if inside or lvl <= stop:
+            lo = _morton(cx, cy)
+            ranges.append((lo, lo + (1 << (2 * lvl)) - 1))
+            continue
+        half = size >> 1
+        stack.extend((
+            (cx, cy, lvl - 1), (cx + half, cy, lvl - 1),
+            (cx, cy + half, lvl - 1), (cx + half, cy + half, lvl - 1),
+        ))
+    ranges.sort()
+    merged: list[tuple[int, int]] = []
+    for lo, hi in ranges:
+        if merged and lo <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(hi, merged[-1][1]))
+        else:
+            merged.append((lo, hi))
+    return merged
+
+
+def parse_bbox(raw: str) -> tuple[float, float, float, float]:
+    """Parse "minlng,minlat,maxlng,maxlat". minlng > maxlng means it crosses ±180°."""
+    parts = raw.split(",")
+    if len(parts) != 4:
+        raise ValueError("bbox needs 4 comma-separated numbers")
+    min_lng, min_lat, max_lng, max_lat = (float(p) for p in parts)
+    if not all(map(math.isfinite, (min_lng, min_lat, max_lng, max_lat))):
+        raise ValueError("bbox values must be finite numbers")
+    if not (-180.0 <= min_lng <= 180.0 and -180.0 <= max_lng <= 180.0):
+        raise ValueError("bbox longitudes must be within [-180, 180]")
+    if not (-90.0 <= min_lat <= 90.0 and -90.0 <= max_lat <= 90.0):
+        raise ValueError("bbox latitudes must be within [-90, 90]")
+    if min_lat > max_lat:
+        raise ValueError("bbox minlat is greater than maxlat")
+    return min_lng, min_lat, max_lng, max_lat
+
+
+def points_in_polygon(
+    lng: np.ndarray, lat: np.ndarray, rings: Sequence[np.ndarray],
+) -> np.ndarray:
+    """Boolean mask of the points strictly inside a GeoJSON polygon.
+
+    `rings` are closed [lng, lat] rings (outer ring first, then holes); the
+    even-odd ray-crossing rule over all their edges handles the holes. Points
+    outside the polygon's bounding box are rejected before the edge test.
+    """
+    edges = np.concatenate([np.stack((r[:-1], r[1:]), axis=1) for r in rings])
+    (x0, y0), (x1, y1) = edges[:, 0].T, edges[:, 1].T
+    lo, hi = edges.min(axis=(0, 1)), edges.max(axis=(0, 1))
+    mask = (lo[0] <= lng) & (lng <= hi[0]) & (lo[1] <= lat) & (lat <= hi[1])
+    candidates = np.flatnonzero(mask)
+    px, py = lng[candidates, None], lat[candidates, None]
+    crosses = (y0 > py) != (y1 > py)
+    with np.errstate(divide="ignore", invalid="ignore"):    # horizontal edges never cross
+        x_at = x0 + (py - y0) * (x1 - x0) / (y1 - y0)
+    mask[candidates] = np.count_nonzero(crosses & (px < x_at), axis=1) % 2 == 1
+    return mask
+
+
+class MortonIndex:
+    """Sorted (morton key, id) pairs plus each id's exact coordinates."""
+
+    def __init__(self) -> None:
+        self._entries: list[tuple[int, int]] = []
+        self._points: dict[int, tuple[float, float, int]] = {}   # id → (lat, lng, key)
+
+    def add(self, item_id: int, lat: float, lng: float) -> None:
+        self.discard(item_id)
+        key = _morton(*_quantize(lat, lng))
+        self._points[item_id] = (lat, lng, key)
+        insort(self._entries, (key, item_id))
+
+    def discard(self, item_id: int) -> None:
+        point = self._points.pop(item_id, None)
+        if point is not None:
+            entry = (point[2], item_id)
+            del self._entries[bisect_left(self._entries, entry)]
+
+    def query(self, bbox: tuple[float, float, float, float]) -> list[int]:
+        """Ids of points inside bbox (edges inclusive), in ascending id order."""
+        min_lng, min_lat, max_lng, max_lat = bbox
+        if min_lng > max_lng:       # antimeridian: split into two boxes
+            return sorted(
+                self.query((min_lng, min_lat, 180.0, max_lat))
+                + self.query((-180.0, min_lat, max_lng, max_lat))
+            )
+        qx0, qy0 = _quantize(min_lat, min_lng)
+        qx1, qy1 = _quantize(max_lat, max_lng)
+        entries, points = self._entries, self._points
+        hits: list[int] = []
+        for lo, hi in _key_ranges(qx0, qy0, qx1, qy1):
+            start = bisect_left(entries, lo, key=_key_of)
+            end = bisect_right(entries, hi, lo=start, key=_key_of)
+            for _, item_id in entries[start:end]:
+                lat, lng, _ = points[item_id]
+                if min_lat <= lat <= max_lat and min_lng <= lng <= max_lng:
+                    hits.append(item_id)
+        hits.sort()
+        return hits
@@ -3,39 +3,96 @@ routes/maps.py
 ─────────────────────────────────────────────────────────────────────────────
 Purpose : FastAPI router for all map-related data — financial history markers,
           GeoJSON region polygons, custom preset locations, and user-drawn
-          shapes. All endpoints require a valid Bearer JWT.
+          shapes. All endpoints require a valid Bearer JWT, checked once per
+          request by JWTAuthMiddleware (middleware.py) before routing.
 
-Used by : main.py (mounted under /maps prefix)
+Used by : main.py (app.include_router; the /maps prefix is set on its PrefixRouter)
+Writes  : every endpoint is async and never awaits between reading and writing
+          a store, so the event loop runs each mutation to completion on its
+          own; that is what keeps ids unique without a lock (users.py does the same)
 
 Key variables
-  HISTORY_MARKERS  – static list of 15 financial centre dicts { id, name, lat, lng, value, change }
-  GEOJSON_DATA     – static FeatureCollection with 8 world-region polygons
-  _CUSTOM_ITEMS    – mutable in-memory list of preset location dicts (12 seeds)
+  Marker           – frozen, slotted dataclass for one history marker
+  HISTORY_MARKERS  – static tuple of 15 financial centre Markers { id, name, lat, lng, value, change, project }
+  GEOJSON_DATA     – static FeatureCollection with 8 world-region polygons, deep-frozen
+                     (MappingProxyType / tuple) since it is shared by every request;
+                     each Polygon ring is a read-only float32 numpy array
+  _HISTORY_BYTES / _GEOJSON_BYTES – the two static datasets above, JSON-encoded
+                     once at import and served verbatim
+  _HISTORY_ETAG / _GEOJSON_ETAG   – strong ETags of those bodies; a matching
+                     If-None-Match is answered with 304 Not Modified
+  CustomItem       – mutable msgspec.Struct for one preset location
+  _CUSTOM_ITEMS    – mutable in-memory store of preset locations, id → CustomItem (12 seeds);
+                     preset responses are encoded with msgspec.json
   _next_custom_id  – auto-increment counter for new presets (starts at 13)
-  _SAVED_SHAPES    – mutable in-memory list of user-drawn shape dicts
+  _HISTORY_INDEX / _CUSTOM_INDEX – MortonIndex (geoindex.py) over marker / preset
+                     lat,lng for ?bbox= queries; _CUSTOM_INDEX is kept in step by
+                     the preset write endpoints
+  _REGION_MARKER_IDS – GeoJSON feature id → ids of the history markers inside
+                     that polygon (numpy point-in-polygon, computed once at import)
+  CustomItemIn / CustomItemUpdate – POST / PUT bodies for presets (pydantic)
+  ShapeIn / ShapeUpdate           – one drawn shape in POST / PUT bodies (pydantic)
+  _SAVED_SHAPES    – mutable in-memory store of user-drawn shapes, id → dict
   _next_shape_id   – auto-increment counter for saved shapes (starts at 1)
 
 Endpoints
-  GET    /maps/history          – returns HISTORY_MARKERS
-  GET    /maps/geojson          – returns GEOJSON_DATA
+  GET    /maps/history          – returns HISTORY_MARKERS (ETag / 304)
+  GET    /maps/geojson          – returns GEOJSON_DATA (ETag / 304)
   GET    /maps/custom           – lists preset locations
+         (/history and /custom accept ?bbox=minlng,minlat,maxlng,maxlat
+          and ?offset= / ?limit= paging; /history also ?region=<feature id>)
   POST   /maps/custom           – adds a preset location
   PUT    /maps/custom/{id}      – updates a preset location
   DELETE /maps/custom/{id}      – deletes a preset location
-  GET    /maps/shapes           – lists saved shapes
+  GET    /maps/shapes           – lists saved shapes (streamed JSON array)
   POST   /maps/shapes           – appends new drawn shapes (accumulates, does not replace)
   PUT    /maps/shapes/{id}      – updates a saved shape
   DELETE /maps/shapes/{id}      – deletes a saved shape
 """
 from __future__ import annotations
-from typing import Any
-from fastapi import APIRouter, Depends, HTTPException
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+import hashlib
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Optional
+import msgspec
+import numpy as np
+import orjson
+from fastapi import HTTPException, Query, Request, Response
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel, TypeAdapter, ValidationError, field_validator
+from .deps import reject_null
+from .geoindex import MortonIndex, parse_bbox, points_in_polygon
+from .streaming import stream_json_array
+from .routing import PrefixRouter
 
-router = APIRouter()
-security = HTTPBearer()
+router = PrefixRouter(prefix="/maps")
 
-HISTORY_MARKERS = [
+@dataclass(slots=True, frozen=True)
+class Marker:
+    id: int
+    name: str
+    lat: float
+    lng: float
+    value: float
+    change: float
+    project: str
+
+
+class CustomItem(msgspec.Struct, omit_defaults=True):
+    """Preset location; unset optional fields are left out of the JSON."""
+    id: int
+    name: str
+    lat: float
+    lng: float
+    type: str
+    description: Optional[str] = None
+    project: Optional[str] = None
+    boundsNE: Optional[tuple[float, float]] = None
+    boundsSW: Optional[tuple[float, float]] = None
+
+
+# Slotted records instead of dicts: no per-row hash table; orjson encodes dataclasses natively
+HISTORY_MARKERS: tuple[Marker, ...] = tuple(Marker(**d) for d in [
     {"id": 1,  "name": "New York",    "lat": 40.71,  "lng": -74.01, "value": 1.082, "change":  0.15, "project": "finance"},
     {"id": 2,  "name": "London",      "lat": 51.51,  "lng":  -0.13, "value": 0.856, "change": -0.23, "project": "finance"},
     {"id": 3,  "name": "Tokyo",       "lat": 35.69,  "lng": 139.69, "value": 148.5, "change":  0.85, "project": "analytics"},
@@ -51,9 +108,37 @@ HISTORY_MARKERS = [
     {"id": 13, "name": "Shanghai",    "lat": 31.23,  "lng": 121.47, "value": 7.254, "change": -0.18, "project": "analytics"},
     {"id": 14, "name": "Johannesburg","lat": -26.20, "lng":  28.04, "value": 18.32, "change": -0.41, "project": "global"},
     {"id": 15, "name": "Seoul",       "lat": 37.57,  "lng": 126.98, "value": 1325.0,"change":  1.24, "project": "analytics"},
-]
+])
+
+
+def _freeze(value: Any) -> Any:
+    """Recursively turn dicts into read-only MappingProxyType and lists into tuples."""
+    if isinstance(value, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
 
-GEOJSON_DATA = {
+def _pack_ring(ring: list) -> np.ndarray:
+    coords = np.asarray(ring, dtype=np.float32)
+    coords.flags.writeable = False
+    return coords
+
+
+def _pack_coordinates(collection: dict) -> dict:
+    """Store each Polygon ring as its own read-only float32 array (display-only data).
+
+    One array per ring, since a hole rarely has as many vertices as the outer ring.
+    """
+    for feature in collection["features"]:
+        geometry = feature["geometry"]
+        assert geometry["type"] == "Polygon", geometry["type"]
+        geometry["coordinates"] = tuple(_pack_ring(r) for r in geometry["coordinates"])
+    return collection
+
+
+GEOJSON_DATA: MappingProxyType = _freeze(_pack_coordinates({
     "type": "FeatureCollection",
     "features": [
         {
@@ -145,11 +230,112 @@ GEOJSON_DATA = {
             },
         },
     ],
+}))
+
+# Both datasets are static, so encode them once instead of on every GET
+_HISTORY_BYTES = orjson.dumps(HISTORY_MARKERS)
+# default: MappingProxyType → dict; OPT_SERIALIZE_NUMPY writes the float32 arrays in C
+_GEOJSON_BYTES = orjson.dumps(GEOJSON_DATA, default=dict, option=orjson.OPT_SERIALIZE_NUMPY)
+
+
+def _etag(body: bytes) -> str:
+    return '"' + hashlib.sha256(body).hexdigest()[:16] + '"'
+
+
+_HISTORY_ETAG = _etag(_HISTORY_BYTES)
+_GEOJSON_ETAG = _etag(_GEOJSON_BYTES)
+
+
+def _static_json(request: Request, body: bytes, etag: str) -> Response:
+    """Serve a pre-encoded static body, or 304 if the client already has this ETag."""
+    headers = {"ETag": etag, "Cache-Control": "private, max-age=60"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def _parse_bbox_param(bbox: str) -> tuple[float, float, float, float]:
+    try:
+        return parse_bbox(bbox)
+    except ValueError as exc:
+        raise HTTPException(status_code=422, detail=f"Invalid bbox: {exc}")
+
+
+def _page(items: list, offset: int, limit: Optional[int]) -> list:
+    return items[offset:] if limit is None else items[offset:offset + limit]
+
+
+_HISTORY_BY_ID = {m.id: m for m in HISTORY_MARKERS}
+_HISTORY_INDEX = MortonIndex()
+for _m in HISTORY_MARKERS:
+    _HISTORY_INDEX.add(_m.id, _m.lat, _m.lng)
+
+# Markers and regions are both static, so region membership is resolved once
+_HISTORY_IDS = np.fromiter((m.id for m in HISTORY_MARKERS), dtype=np.int64)
+_HISTORY_LAT = np.fromiter((m.lat for m in HISTORY_MARKERS), dtype=np.float32)
+_HISTORY_LNG = np.fromiter((m.lng for m in HISTORY_MARKERS), dtype=np.float32)
+_REGION_MARKER_IDS: dict[int, frozenset[int]] = {
+    f["properties"]["id"]: frozenset(_HISTORY_IDS[
+        points_in_polygon(_HISTORY_LNG, _HISTORY_LAT, f["geometry"]["coordinates"])
+    ].tolist())
+    for f in GEOJSON_DATA["features"]
 }
 
 
+# ── Pydantic models ───────────────────────────────────────────────────────────
+# Stored with model_dump(exclude_unset=True), so rows keep only the fields the
+# client sent; the *Update models make every field optional for partial PUTs,
+# but fields that are required on POST may only be omitted, never null.
+class CustomItemIn(BaseModel):
+    name:        str
+    lat:         float
+    lng:         float
+    type:        str
+    description: Optional[str] = None
+    project:     Optional[str] = None
+    boundsNE:    Optional[tuple[float, float]] = None
+    boundsSW:    Optional[tuple[float, float]] = None
+
+class CustomItemUpdate(BaseModel):
+    name:        Optional[str] = None
+    lat:         Optional[float] = None
+    lng:         Optional[float] = None
+    type:        Optional[str] = None
+    description: Optional[str] = None
+    project:     Optional[str] = None
+    boundsNE:    Optional[tuple[float, float]] = None
+    boundsSW:    Optional[tuple[float, float]] = None
+
+    _not_null = field_validator("name", "lat", "lng", "type", mode="before")(reject_null)
+
+class ShapeIn(BaseModel):
+    name:        str
+    type:        str
+    description: Optional[str] = None
+    lat:         Optional[float] = None
+    lng:         Optional[float] = None
+    radius:      Optional[float] = None
+    boundsNE:    Optional[tuple[float, float]] = None
+    boundsSW:    Optional[tuple[float, float]] = None
+    latlngs:     Optional[list[tuple[float, float]]] = None
+
+class ShapeUpdate(BaseModel):
+    name:        Optional[str] = None
+    type:        Optional[str] = None
+    description: Optional[str] = None
+    lat:         Optional[float] = None
+    lng:         Optional[float] = None
+    radius:      Optional[float] = None
+    boundsNE:    Optional[tuple[float, float]] = None
+    boundsSW:    Optional[tuple[float, float]] = None
+    latlngs:     Optional[list[tuple[float, float]]] = None
+
+    _not_null = field_validator("name", "type", mode="before")(reject_null)
+
+
 # ── Preset locations (mutable in-memory store) ────────────────────────────────
-_CUSTOM_ITEMS: list[dict[str, Any]] = [
+# Keyed by id (dicts keep insertion order, so listing preserves creation order)
+_CUSTOM_ITEMS: dict[int, CustomItem] = {ci.id: ci for ci in (CustomItem(**d) for d in [
     {"id":  1, "name": "Eiffel Tower",      "lat":  48.858, "lng":   2.294, "type": "landmark", "description": "Paris, France",          "project": "infrastructure"},
     {"id":  2, "name": "Colosseum",          "lat":  41.890, "lng":  12.492, "type": "landmark", "description": "Rome, Italy",            "project": "infrastructure"},
     {"id":  3, "name": "Sagrada Família",    "lat":  41.404, "lng":   2.174, "type": "landmark", "description": "Barcelona, Spain",       "project": "infrastructure"},
@@ -162,110 +348,149 @@ _CUSTOM_ITEMS: list[dict[str, Any]] = [
     {"id": 10, "name": "Port of Antwerp",    "lat":  51.260, "lng":   4.400, "type": "port",     "description": "Antwerp, Belgium",       "project": "logistics"},
     {"id": 11, "name": "CERN",               "lat":  46.234, "lng":   6.055, "type": "research", "description": "Geneva, Switzerland",    "project": "research"},
     {"id": 12, "name": "ESA HQ",             "lat":  48.797, "lng":   2.223, "type": "research", "description": "Paris, France",          "project": "research"},
-]
+])}
 _next_custom_id = 13
 
+_CUSTOM_INDEX = MortonIndex()
+
+
+def _index_custom(ci: CustomItem) -> None:
+    """(Re)index a preset after it was added or its lat/lng may have changed."""
+    _CUSTOM_INDEX.add(ci.id, ci.lat, ci.lng)
+
+
+def _msgspec_json(content: Any) -> Response:
+    return Response(msgspec.json.encode(content), media_type="application/json")
+
+
+for _ci in _CUSTOM_ITEMS.values():
+    _index_custom(_ci)
+
 
 # ── Saved drawn shapes (mutable in-memory store) ──────────────────────────────
-_SAVED_SHAPES: list[dict[str, Any]] = []
+_SAVED_SHAPES: dict[int, dict[str, Any]] = {}
 _next_shape_id = 1
 
+# POST /maps/shapes parses its raw body straight into this (pydantic-core)
+_SHAPES_ADAPTER = TypeAdapter(list[ShapeIn])
+
 
 # ── History markers ───────────────────────────────────────────────────────────
 @router.get("/history")
-def get_history(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    return HISTORY_MARKERS
+async def get_history(
+    request: Request,
+    bbox: Optional[str] = None,
+    region: Optional[int] = None,
+    offset: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1),
+):
+    if bbox is None and region is None and offset == 0 and limit is None:
+        return _static_json(request, _HISTORY_BYTES, _HISTORY_ETAG)
+    if bbox is None:
+        markers = HISTORY_MARKERS
+    else:
+        markers = [_HISTORY_BY_ID[i] for i in _HISTORY_INDEX.query(_parse_bbox_param(bbox))]
+    if region is not None:
+        inside = _REGION_MARKER_IDS.get(region)
+        if inside is None:
+            raise HTTPException(status_code=404, detail="Region not found")
+        markers = [m for m in markers if m.id in inside]
+    return _page(markers, offset, limit)
 
 
 # ── GeoJSON ───────────────────────────────────────────────────────────────────
 @router.get("/geojson")
-def get_geojson(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    return GEOJSON_DATA
+async def get_geojson(request: Request):
+    return _static_json(request, _GEOJSON_BYTES, _GEOJSON_ETAG)
 
 
 # ── Preset locations CRUD ─────────────────────────────────────────────────────
 @router.get("/custom")
-def get_custom(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    return _CUSTOM_ITEMS
+async def get_custom(
+    bbox: Optional[str] = None,
+    offset: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1),
+):
+    if bbox is None:
+        items = list(_CUSTOM_ITEMS.values())
+    else:
+        items = [_CUSTOM_ITEMS[i] for i in _CUSTOM_INDEX.query(_parse_bbox_param(bbox))]
+    return _msgspec_json(_page(items, offset, limit))
 
 
 @router.post("/custom")
-def add_custom(
-    item: dict[str, Any],
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-):
+async def add_custom(item: CustomItemIn):
     global _next_custom_id
-    new_item = {**item, "id": _next_custom_id}
+    new_item = CustomItem(id=_next_custom_id, **item.model_dump(exclude_unset=True))
     _next_custom_id += 1
-    _CUSTOM_ITEMS.append(new_item)
-    return new_item
+    _CUSTOM_ITEMS[new_item.id] = new_item
+    _index_custom(new_item)
+    return _msgspec_json(new_item)
 
 
 @router.put("/custom/{item_id}")
-def update_custom(
-    item_id: int,
-    item: dict[str, Any],
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-):
-    for i, ci in enumerate(_CUSTOM_ITEMS):
-        if ci["id"] == item_id:
-            _CUSTOM_ITEMS[i] = {**ci, **item, "id": item_id}
-            return _CUSTOM_ITEMS[i]
-    raise HTTPException(status_code=404, detail="Preset not found")
+async def update_custom(item_id: int, item: CustomItemUpdate):
+    ci = _CUSTOM_ITEMS.get(item_id)
+    if ci is None:
+        raise HTTPException(status_code=404, detail="Preset not found")
+    for name, value in item.model_dump(exclude_unset=True).items():
+        setattr(ci, name, value)
+    _index_custom(ci)
+    return _msgspec_json(ci)
 
 
 @router.delete("/custom/{item_id}")
-def delete_custom(
-    item_id: int,
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-):
-    global _CUSTOM_ITEMS
-    before = len(_CUSTOM_ITEMS)
-    _CUSTOM_ITEMS = [ci for ci in _CUSTOM_ITEMS if ci["id"] != item_id]
-    if len(_CUSTOM_ITEMS) == before:
+async def delete_custom(item_id: int):
+    if _CUSTOM_ITEMS.pop(item_id, None) is None:
         raise HTTPException(status_code=404, detail="Preset not found")
+    _CUSTOM_INDEX.discard(item_id)
     return {"ok": True}
 
 
 # ── Saved shapes CRUD ─────────────────────────────────────────────────────────
 @router.get("/shapes")
-def get_shapes(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    return _SAVED_SHAPES
+async def get_shapes():
+    return stream_json_array(list(_SAVED_SHAPES.values()))
 
 
-@router.post("/shapes")
-def save_shapes(
-    shapes: list[dict[str, Any]],
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-):
-    global _SAVED_SHAPES, _next_shape_id
-    for shape in shapes:
-        _SAVED_SHAPES.append({**shape, "id": _next_shape_id})
-        _next_shape_id += 1
-    return _SAVED_SHAPES
+@router.post(
+    "/shapes",
+    openapi_extra={"requestBody": {
+        "required": True,
+        "content": {"application/json": {"schema": {
+            "type": "array", "items": ShapeIn.model_json_schema(),
+        }}},
+    }},
+)
+async def save_shapes(request: Request):
+    global _next_shape_id
+    try:
+        shapes = _SHAPES_ADAPTER.validate_json(await request.body())
+    except ValidationError as exc:
+        raise RequestValidationError([
+            {**err, "loc": ("body", *err["loc"])} for err in exc.errors(include_url=False)
+        ])
+    start = _next_shape_id
+    _next_shape_id = start + len(shapes)
+    # model_dump() returns fresh dicts, so tag them in place
+    rows = [shape.model_dump(exclude_unset=True) for shape in shapes]
+    for i, row in enumerate(rows, start=start):
+        row["id"] = i
+    _SAVED_SHAPES.update(zip(range(start, _next_shape_id), rows))
+    return list(_SAVED_SHAPES.values())
 
 
 @router.put("/shapes/{shape_id}")
-def update_shape(
-    shape_id: int,
-    shape: dict[str, Any],
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-):
-    for i, s in enumerate(_SAVED_SHAPES):
-        if s["id"] == shape_id:
-            _SAVED_SHAPES[i] = {**s, **shape, "id": shape_id}
-            return _SAVED_SHAPES[i]
-    raise HTTPException(status_code=404, detail="Shape not found")
+async def update_shape(shape_id: int, shape: ShapeUpdate):
+    s = _SAVED_SHAPES.get(shape_id)
+    if s is None:
+        raise HTTPException(status_code=404, detail="Shape not found")
+    s.update(shape.model_dump(exclude_unset=True))
+    return s
 
 
 @router.delete("/shapes/{shape_id}")
-def delete_shape(
-    shape_id: int,
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-):
-    global _SAVED_SHAPES
-    before = len(_SAVED_SHAPES)
-    _SAVED_SHAPES = [s for s in _SAVED_SHAPES if s["id"] != shape_id]
-    if len(_SAVED_SHAPES) == before:
+async def delete_shape(shape_id: int):
+    if _SAVED_SHAPES.pop(shape_id, None) is None:
         raise HTTPException(status_code=404, detail="Shape not found")
     return {"ok": True}
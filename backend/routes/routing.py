@@ -0,0 +1,31 @@
+"""
+routes/routing.py
+─────────────────────────────────────────────────────────────────────────────
+Purpose : APIRouter that owns its URL prefix and turns away any request
+          outside it with one string comparison. The app router tries each
+          included router in turn and a router scans all of its routes'
+          regexes, so without this every request paid for the routers
+          registered before the one that serves it. Only FastAPI >= 0.137
+          dispatches through the included router's matches(); older releases
+          copy its routes into the app router, so requirements.txt pins it.
+
+Used by : auth.py / users.py / maps.py / files.py (router = PrefixRouter(prefix=…))
+
+Key classes
+  PrefixRouter  – APIRouter whose matches() rejects paths outside self.prefix
+"""
+from __future__ import annotations
+
+from fastapi import APIRouter
+from starlette.routing import Match, get_route_path
+from starlette.types import Scope
+
+
+class PrefixRouter(APIRouter):
+    def matches(self, scope: Scope) -> tuple[Match, Scope]:
+        prefix = self.prefix
+        if prefix and scope["type"] in ("http", "websocket"):
+            path = get_route_path(scope)
+            if not path.startswith(prefix) or path[len(prefix):len(prefix) + 1] not in ("", "/"):
+                return Match.NONE, {}
+        return super().matches(scope)
@@ -0,0 +1,33 @@
+"""
+routes/streaming.py
+─────────────────────────────────────────────────────────────────────────────
+Purpose : Helper for list endpoints whose stores grow without bound. Streams
+          a JSON array batch by batch instead of encoding the whole list into
+          one bytes object before the first byte is sent.
+
+Used by : maps.py (GET /maps/shapes), users.py (GET /users/)
+
+Key variables
+  STREAM_BATCH        – items encoded per chunk
+  stream_json_array() – list → StreamingResponse emitting `[item,item,…]`
+"""
+from __future__ import annotations
+
+from typing import Any, AsyncIterator, Sequence
+import orjson
+from fastapi.responses import StreamingResponse
+
+STREAM_BATCH = 256
+
+
+async def _iter_json_array(items: Sequence[Any]) -> AsyncIterator[bytes]:
+    yield b"["
+    for start in range(0, len(items), STREAM_BATCH):
+        chunk = b",".join(orjson.dumps(item) for item in items[start:start + STREAM_BATCH])
+        yield chunk if start == 0 else b"," + chunk
+    yield b"]"
+
+
+def stream_json_array(items: Sequence[Any]) -> StreamingResponse:
+    """Stream `items` as a JSON array. Pass a snapshot, not the live store."""
+    return StreamingResponse(_iter_json_array(items), media_type="application/json")
@@ -4,34 +4,41 @@ routes/users.py
 Purpose : FastAPI router for user management and profile endpoints.
           Handles CRUD for the user list and per-user profile overrides.
 
-Used by : main.py (mounted under /users prefix)
-Imports : SECRET_KEY, ALGORITHM, MOCK_USERS from routes/auth.py
+Used by : main.py (app.include_router; the /users prefix is set on its PrefixRouter)
+Auth    : every /users/* request is verified by JWTAuthMiddleware (middleware.py)
+          before it reaches this router; /me reads the user via deps.get_current_user()
+Writes  : async endpoints with no await inside a mutation, no locks (see maps.py)
 
 Key variables
-  _USER_LIST        – mutable in-memory list of user dicts (10 seed users)
+  _UserTable        – column-oriented (SoA) user store with an id → row index
+  _USERS            – the mutable in-memory _UserTable (10 seed users)
   _next_user_id     – auto-increment counter for new users (starts at 11)
   PROFILE_STORE     – dict[email → profile overrides] persisted while server runs
-  get_current_user  – dependency that validates the Bearer JWT and returns the user dict
+  _PROFILE_CACHE    – dict[email → built /me profile]; dropped by PUT /users/me
+  UserIn / UserUpdate – POST / PUT bodies for the user list (pydantic)
 
 Endpoints
   GET    /users/me       – returns current user merged with profile overrides
   PUT    /users/me       – updates name, email, avatar_mode, avatar_base64
-  GET    /users/         – lists all users
+  GET    /users/         – lists users (streamed JSON array); optional ?role= / ?status=
+                           filters (column scans) and ?offset= / ?limit= paging
+  GET    /users/table    – all users as columns { id: [...], name: [...], …, extra: [...] }
   POST   /users/         – creates a new user
   PUT    /users/{id}     – updates a user by id
   DELETE /users/{id}     – deletes a user by id
 """
 from __future__ import annotations
 
-from typing import Any, Optional
-from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from jose import jwt, JWTError
-from pydantic import BaseModel
-from .auth import SECRET_KEY, ALGORITHM, MOCK_USERS
+from array import array
+from dataclasses import dataclass, field
+from typing import Any, Iterable, Optional
+from fastapi import HTTPException, Query
+from pydantic import BaseModel, field_validator
+from .deps import get_current_user, reject_null
+from .streaming import stream_json_array
+from .routing import PrefixRouter
 
-router = APIRouter()
-security = HTTPBearer()
+router = PrefixRouter(prefix="/users")
 
 _JOINED_DATES = [
     "2023-01-15", "2023-03-22", "2023-05-10", "2023-07-04",
@@ -39,34 +46,198 @@ _JOINED_DATES = [
     "2024-06-21", "2024-09-05",
 ]
 
-_USER_LIST: list[dict[str, Any]] = [
-    {
-        "id": i + 1,
-        "name": name,
-        "email": f"user{i + 1}@example.com",
-        "role": role,
-        "status": "inactive" if i % 4 == 0 else "active",
-        "joined": _JOINED_DATES[i],
-    }
-    for i, (name, role) in enumerate(
-        [
-            ("Alice Johnson", "admin"),
-            ("Bob Smith", "editor"),
-            ("Carol White", "viewer"),
-            ("David Brown", "editor"),
-            ("Eva Martinez", "viewer"),
-            ("Frank Lee", "admin"),
-            ("Grace Kim", "editor"),
-            ("Henry Wilson", "viewer"),
-            ("Iris Chen", "editor"),
-            ("Jack Davis", "viewer"),
-        ]
-    )
-]
+_MISSING = object()   # column placeholder for a field the client never sent
+_COLUMN_FIELDS = ("name", "email", "role", "joined")
+_STATUS_OTHER = 255   # status code: the value is in status_other (vocabulary full)
+
+
+@dataclass
+class _UserTable:
+    """Column-oriented (SoA) user store: row i of every column is one user.
+
+    name/email/role/joined are plain lists, status is dictionary-encoded into a
+    bytearray (codes index `status_values`), and any other keys a client sends
+    (avatar_*, password, …) live in a per-row `extra` dict. Rows keep creation
+    order; `_by_id` maps id → row index. Once the vocabulary holds 255
+    values, further ones are kept verbatim in `status_other` (id → status).
+    """
+    ids: array = field(default_factory=lambda: array("q"))
+    columns: dict[str, list[Any]] = field(default_factory=lambda: {f: [] for f in _COLUMN_FIELDS})
+    status: bytearray = field(default_factory=bytearray)
+    status_values: list[Any] = field(default_factory=lambda: [_MISSING, "inactive", "active"])
+    status_other: dict[int, str] = field(default_factory=dict)
+    extra: list[dict[str, Any]] = field(default_factory=list)
+    _by_id: dict[int, int] = field(default_factory=dict)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _status_code(self, user_id: int, value: Any) -> int:
+        # Validate before touching status_other so a rejected write leaves the row as it was
+        if value is not _MISSING and not isinstance(value, str):
+            raise ValueError("status must be a string")
+        self.status_other.pop(user_id, None)
+        if value is _MISSING:
+            return 0
+        try:
+            return self.status_values.index(value)
+        except ValueError:
+            pass
+        if len(self.status_values) < _STATUS_OTHER:
+            self.status_values.append(value)
+            return len(self.status_values) - 1
+        self.status_other[user_id] = value
+        return _STATUS_OTHER
+
+    def _status(self, i: int) -> Any:
+        code = self.status[i]
+        if code == _STATUS_OTHER:
+            return self.status_other[self.ids[i]]
+        return self.status_values[code]
+
+    def row(self, i: int) -> dict[str, Any]:
+        """Materialize row i as the dict the API returns."""
+        out: dict[str, Any] = {"id": self.ids[i]}
+        for name in ("name", "email", "role"):
+            value = self.columns[name][i]
+            if value is not _MISSING:
+                out[name] = value
+        if self.status[i]:
+            out["status"] = self._status(i)
+        if self.columns["joined"][i] is not _MISSING:
+            out["joined"] = self.columns["joined"][i]
+        out.update(self.extra[i])
+        return out
+
+    def rows(self, indices: Optional[Iterable[int]] = None) -> list[dict[str, Any]]:
+        return [self.row(i) for i in (range(len(self.ids)) if indices is None else indices)]
+
+    def select(self, role: Optional[str] = None, status: Optional[str] = None) -> list[int]:
+        """Row indices matching every given filter, via column scans."""
+        indices: Iterable[int] = range(len(self.ids))
+        if status is not None:
+            if status in self.status_values:
+                code = self.status_values.index(status)
+                indices = [i for i, c in enumerate(self.status) if c == code]
+            else:
+                other, ids = self.status_other, self.ids
+                indices = [
+                    i for i, c in enumerate(self.status)
+                    if c == _STATUS_OTHER and other[ids[i]] == status
+                ]
+        if role is not None:
+            roles = self.columns["role"]
+            indices = [i for i in indices if roles[i] == role]
+        return list(indices)
+
+    def append(self, user_id: int, data: dict[str, Any]) -> dict[str, Any]:
+        code = self._status_code(user_id, data.get("status", _MISSING))
+        self._by_id[user_id] = len(self.ids)
+        self.ids.append(user_id)
+        for name, column in self.columns.items():
+            column.append(data.get(name, _MISSING))
+        self.status.append(code)
+        self.extra.append({
+            k: v for k, v in data.items()
+            if k not in self.columns and k not in ("id", "status")
+        })
+        return self.row(len(self.ids) - 1)
+
+    def update(self, user_id: int, patch: dict[str, Any]) -> Optional[dict[str, Any]]:
+        i = self._by_id.get(user_id)
+        if i is None:
+            return None
+        if "status" in patch:
+            self.status[i] = self._status_code(user_id, patch["status"])
+        for k, v in patch.items():
+            if k in self.columns:
+                self.columns[k][i] = v
+            elif k not in ("id", "status"):
+                self.extra[i][k] = v
+        return self.row(i)
+
+    def delete(self, user_id: int) -> bool:
+        i = self._by_id.pop(user_id, None)
+        if i is None:
+            return False
+        del self.ids[i]
+        for column in self.columns.values():
+            del column[i]
+        del self.status[i]
+        del self.extra[i]
+        self.status_other.pop(user_id, None)
+        for j in range(i, len(self.ids)):      # rows after i shifted down by one
+            self._by_id[self.ids[j]] = j
+        return True
+
+    def as_columns(self) -> dict[str, list[Any]]:
+        """Columnar view for GET /users/table (missing fields → null).
+
+        Everything is copied, so the response never shares state with the store.
+        """
+        def _plain(values: list[Any]) -> list[Any]:
+            return [None if v is _MISSING else v for v in values]
+        return {
+            "id": self.ids.tolist(),
+            **{name: _plain(column) for name, column in self.columns.items()},
+            "status": _plain([self._status(i) for i in range(len(self.ids))]),
+            "extra": [dict(e) for e in self.extra],
+        }
+
+
+_USERS = _UserTable()
+for _i, (_name, _role) in enumerate(
+    [
+        ("Alice Johnson", "admin"),
+        ("Bob Smith", "editor"),
+        ("Carol White", "viewer"),
+        ("David Brown", "editor"),
+        ("Eva Martinez", "viewer"),
+        ("Frank Lee", "admin"),
+        ("Grace Kim", "editor"),
+        ("Henry Wilson", "viewer"),
+        ("Iris Chen", "editor"),
+        ("Jack Davis", "viewer"),
+    ]
+):
+    _USERS.append(_i + 1, {
+        "name": _name,
+        "email": f"user{_i + 1}@example.com",
+        "role": _role,
+        "status": "inactive" if _i % 4 == 0 else "active",
+        "joined": _JOINED_DATES[_i],
+    })
 _next_user_id = 11
 
 # In-memory profile store (persists while server runs)
 PROFILE_STORE: dict[str, dict] = {}
+# Built profiles for GET /me; an entry only changes when PUT /me drops it
+_PROFILE_CACHE: dict[str, dict] = {}
+
+
+# Stored with model_dump(exclude_unset=True): only the fields the client sent.
+# UserUpdate fields that are required on POST may be omitted, never null.
+class UserIn(BaseModel):
+    name:          str
+    email:         str
+    role:          str
+    status:        str
+    joined:        str
+    avatar_mode:   Optional[str] = None
+    avatar_base64: Optional[str] = None
+    password:      Optional[str] = None
+
+class UserUpdate(BaseModel):
+    name:          Optional[str] = None
+    email:         Optional[str] = None
+    role:          Optional[str] = None
+    status:        Optional[str] = None
+    joined:        Optional[str] = None
+    avatar_mode:   Optional[str] = None
+    avatar_base64: Optional[str] = None
+    password:      Optional[str] = None
+
+    _not_null = field_validator("name", "email", "role", "status", "joined", mode="before")(reject_null)
 
 
 class UpdateProfileRequest(BaseModel):
@@ -76,22 +247,6 @@ class UpdateProfileRequest(BaseModel):
     avatar_mode: Optional[str] = None
 
 
-def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    try:
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub", "")
-        user = MOCK_USERS.get(email)
-        if not user:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found"
-            )
-        return user
-    except JWTError:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token"
-        )
-
-
 def _build_profile(base_user: dict) -> dict:
     """Merge base user with any saved profile overrides."""
     data = {k: v for k, v in base_user.items() if k != "password"}
@@ -100,15 +255,18 @@ def _build_profile(base_user: dict) -> dict:
 
 
 @router.get("/me")
-def get_me(current_user: dict = Depends(get_current_user)):
-    return _build_profile(current_user)
+async def get_me():
+    current_user = get_current_user()
+    email = current_user["email"]
+    cached = _PROFILE_CACHE.get(email)
+    if cached is None:
+        cached = _PROFILE_CACHE[email] = _build_profile(current_user)
+    return cached
 
 
 @router.put("/me")
-def update_me(
-    body: UpdateProfileRequest,
-    current_user: dict = Depends(get_current_user),
-):
+async def update_me(body: UpdateProfileRequest):
+    current_user = get_current_user()
     email = current_user["email"]
     store = PROFILE_STORE.setdefault(email, {})
 
@@ -123,48 +281,49 @@ def update_me(
             store["avatar_base64"] = None          # clear image when reverting to letter
     if body.avatar_base64 is not None:
         store["avatar_base64"] = body.avatar_base64
+    _PROFILE_CACHE.pop(email, None)
 
     return _build_profile(current_user)
 
 
 @router.get("/")
-def get_users(current_user: dict = Depends(get_current_user)):
-    return _USER_LIST
+async def get_users(
+    role: Optional[str] = None,
+    status_filter: Optional[str] = Query(None, alias="status"),
+    offset: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1),
+):
+    if role is None and status_filter is None:
+        indices = range(len(_USERS))
+    else:
+        indices = _USERS.select(role=role, status=status_filter)
+    indices = indices[offset:] if limit is None else indices[offset:offset + limit]
+    return stream_json_array(_USERS.rows(indices))
+
+
+@router.get("/table")
+async def get_users_table():
+    return _USERS.as_columns()
 
 
 @router.post("/")
-def create_user(
-    user: dict[str, Any],
-    current_user: dict = Depends(get_current_user),
-):
+async def create_user(user: UserIn):
     global _next_user_id
-    new_user = {**user, "id": _next_user_id}
+    new_user = _USERS.append(_next_user_id, user.model_dump(exclude_unset=True))
     _next_user_id += 1
-    _USER_LIST.append(new_user)
     return new_user
 
 
 @router.put("/{user_id}")
-def update_user(
-    user_id: int,
-    user: dict[str, Any],
-    current_user: dict = Depends(get_current_user),
-):
-    for i, u in enumerate(_USER_LIST):
-        if u["id"] == user_id:
-            _USER_LIST[i] = {**u, **user, "id": user_id}
-            return _USER_LIST[i]
-    raise HTTPException(status_code=404, detail="User not found")
+async def update_user(user_id: int, user: UserUpdate):
+    u = _USERS.update(user_id, user.model_dump(exclude_unset=True))
+    if u is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return u
 
 
 @router.delete("/{user_id}")
-def delete_user(
-    user_id: int,
-    current_user: dict = Depends(get_current_user),
-):
-    global _USER_LIST
-    before = len(_USER_LIST)
-    _USER_LIST = [u for u in _USER_LIST if u["id"] != user_id]
-    if len(_USER_LIST) == before:
+async def delete_user(user_id: int):
+    if not _USERS.delete(user_id):
         raise HTTPException(status_code=404, detail="User not found")
     return {"ok": True}